@@ -1,9 +1,15 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-import base64, os, re, uuid, logging
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, StrictInt
+import asyncio, os, re, string, time, uuid, logging, threading
+from collections import defaultdict
+import anyio
+import pybase64
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import List, Optional
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -12,7 +18,11 @@ logger = logging.getLogger(__name__)
 IMAGES_ROOT = os.path.abspath("./imagens")
 os.makedirs(IMAGES_ROOT, exist_ok=True)
 
+_LOG_REQUESTS = os.getenv("ENVIRONMENT") == "development"
+SERVE_STATIC = os.getenv("SERVE_STATIC", "1") != "0"
+
 BASE_URL_ENV = os.getenv("BASE_URL")
+_BASE_URL_CACHED = BASE_URL_ENV.rstrip("/") if BASE_URL_ENV else None
 
 # CORS: restringe via variável de ambiente CORS_ORIGINS (lista separada por vírgula)
 # Ex.: CORS_ORIGINS="https://app.seu-dominio.com,https://www.seu-dominio.com"
@@ -33,8 +43,14 @@ if not CORS_ORIGINS:
         "http://127.0.0.1:8006",
     ]
 
-DATA_URL_RE = re.compile(r"^data:(?P<mime>[\w\-\.+/]+);base64,(?P<b64>.+)$")
+# Cabeçalho "data:<mime>;base64," deve caber nos primeiros bytes da data URL
+DATA_URL_HEADER_MAX = 256
+# Blocos de decodificação (múltiplo de 4 para alinhar com grupos base64)
+DECODE_CHUNK = 256 * 1024
+# Blocos decodificados acumulados por chamada de os.writev
+WRITEV_BATCH = 8
 ALLOWED_MIMES = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp"}
+_ALLOWED_MIMES_LIST = list(ALLOWED_MIMES.keys())
 
 # Permitir configurar o tamanho máximo por variável de ambiente (padrão 25MB)
 try:
@@ -42,18 +58,47 @@ try:
 except ValueError:
     MAX_SIZE_MB = 25
 
-FILENAME_RE = re.compile(r"^(?P<registro>\d+)-(?P<ponto>\d+)\.(?P<ext>jpg|jpeg|png|webp)$", re.IGNORECASE)
+# Máximo de imagens por chamada de /upload/batch
+MAX_BATCH_ITEMS = 50
+
+# Tabela de deleção para sanitizar filename (equivale a [^\w\-_\.] restrito a ASCII;
+# caracteres não-ASCII são descartados antes, no encode)
+_FILENAME_ALLOWED = frozenset((string.ascii_letters + string.digits + "_-.").encode("ascii"))
+_FILENAME_DELETE = bytes(b for b in range(256) if b not in _FILENAME_ALLOWED)
+
+# Padrão em bytes: o filename já é ASCII após a sanitização
+FILENAME_RE = re.compile(rb"^(?P<registro>\d+)-(?P<ponto>\d+)\.(?P<ext>jpg|jpeg|png|webp)$", re.IGNORECASE)
+
+# Cache em processo dos sequenciais em uso por (diretório, prefixo, extensão).
+# Só é populado após um conflito (scandir), evitando crescer com prefixos aleatórios de "misc".
+_seq_cache: dict = {}
+_seq_locks: dict = defaultdict(threading.RLock)
+
+# Cache das checagens de disco do /health (monitores consultam a cada poucos segundos)
+HEALTH_CACHE_TTL = 30
+_health_cache = {"t": float("-inf"), "exists": False, "writable": False}
 
 class UploadIn(BaseModel):
+    # Validação toda no pydantic-core (v2); tipos estritos evitam coerção em Python
+    model_config = ConfigDict(extra="ignore")
+
     filename: str
-    data_url: str
-    registro: Optional[int] = None
-    ponto: Optional[int] = None
+    data_url: str = Field(..., max_length=50 * 1024 * 1024)
+    registro: Optional[StrictInt] = None
+    ponto: Optional[StrictInt] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Mais threads para o I/O de disco dos uploads (padrão do anyio: 40)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 100
+    yield
 
 app = FastAPI(
     title="Upload Service",
     description="Serviço de upload e pré-processamento de imagens YOLO",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configurar CORS com configurações mais específicas para produção
@@ -65,35 +110,121 @@ app.add_middleware(
     allow_headers=["Content-Type", "Authorization"],  # Headers específicos
 )
 
-# Montar arquivos estáticos com configurações de segurança
-app.mount("/imagens", StaticFiles(directory=IMAGES_ROOT), name="imagens")
+# Montar arquivos estáticos com configurações de segurança.
+# Em produção o Nginx serve /imagens direto do disco (sendfile); SERVE_STATIC=0 desativa o mount.
+if SERVE_STATIC:
+    app.mount("/imagens", StaticFiles(directory=IMAGES_ROOT), name="imagens")
+
+
+def decoded_size(data_url: str, start: int) -> int:
+    """Tamanho exato do binário decodificado, calculado a partir do comprimento do base64."""
+    pad = data_url.count("=", max(start, len(data_url) - 2))
+    return ((len(data_url) - start) * 3) // 4 - pad
 
 
 def parse_data_url(data_url: str):
-    """Parse e valida data URL base64."""
+    """
+    Parse e valida o cabeçalho da data URL base64.
+    Retorna (mime, início do payload); o payload em si só é lido na decodificação.
+    """
     if not isinstance(data_url, str) or len(data_url) > 50 * 1024 * 1024:  # Limite de 50MB na string
         raise HTTPException(status_code=400, detail="data_url inválido ou muito grande")
     
-    m = DATA_URL_RE.match(data_url)
-    if not m:
+    # Parse manual do cabeçalho: evita varrer/copiar o payload inteiro com regex
+    header_end = data_url.find(",", 0, DATA_URL_HEADER_MAX)
+    if header_end == -1 or not data_url.startswith("data:") or not data_url.endswith(";base64", 0, header_end):
         raise HTTPException(status_code=400, detail="data_url inválido")
     
-    mime = m.group("mime").lower()
-    b64 = m.group("b64")
+    mime = data_url[5:header_end - 7].lower()
+    if header_end + 1 >= len(data_url):
+        raise HTTPException(status_code=400, detail="data_url inválido")
     
     if mime not in ALLOWED_MIMES:
         raise HTTPException(status_code=400, detail=f"MIME não permitido: {mime}")
     
-    try:
-        binary = base64.b64decode(b64, validate=True)
-    except Exception as e:
-        logger.error(f"Erro ao decodificar base64: {e}")
+    # Tamanho conhecido pelo comprimento: rejeitar antes de qualquer decodificação
+    start = header_end + 1
+    if (len(data_url) - start) % 4:
         raise HTTPException(status_code=400, detail="base64 inválido")
-    
-    if len(binary) > MAX_SIZE_MB * 1024 * 1024:
+    if decoded_size(data_url, start) > MAX_SIZE_MB * 1024 * 1024:
         raise HTTPException(status_code=413, detail=f"Arquivo > {MAX_SIZE_MB}MB")
     
-    return mime, binary
+    # Nenhuma cópia/encode do payload aqui: todo trabalho O(N) fica na thread de escrita
+    return mime, start
+
+
+def write_chunks(fd: int, chunks: list) -> None:
+    """
+    Grava todos os blocos, com uma syscall scatter-gather quando disponível.
+    Escritas parciais (comuns em NFS/Ceph) são repetidas a partir do ponto onde pararam.
+    """
+    views = [memoryview(chunk) for chunk in chunks]
+    if hasattr(os, "writev"):
+        i = 0
+        while i < len(views):
+            written = os.writev(fd, views[i:])
+            # Pular buffers já gravados por inteiro e avançar dentro do parcial
+            while i < len(views) and written >= len(views[i]):
+                written -= len(views[i])
+                i += 1
+            if written:
+                views[i] = views[i][written:]
+    else:
+        for view in views:
+            while view:
+                view = view[os.write(fd, view):]
+
+
+def decode_to_file(fd: int, data_url: str, start: int) -> int:
+    """
+    Decodifica o payload base64 em blocos diretamente no descritor aberto, sem manter
+    o binário inteiro em memória (o limite de tamanho já foi checado em parse_data_url).
+    Retorna o total de bytes escritos.
+    
+    Cada bloco é uma fatia curta da string (GIL retido só para a cópia); o pybase64
+    lê strings ASCII sem encode e libera o GIL durante a decodificação, então uploads
+    grandes decodificam em paralelo nas threads sem bloquear o event loop.
+    """
+    total = len(data_url)
+    size = 0
+    pending = []
+    
+    for i in range(start, total, DECODE_CHUNK):
+        chunk = data_url[i:i + DECODE_CHUNK]
+        # Padding só é válido no último bloco
+        if i + DECODE_CHUNK < total and chunk[-1] == "=":
+            raise HTTPException(status_code=400, detail="base64 inválido")
+        try:
+            # pybase64 usa kernels SIMD (AVX2/NEON) da libbase64
+            data = pybase64.b64decode(chunk, validate=True)
+        except Exception as e:
+            logger.error(f"Erro ao decodificar base64: {e}")
+            raise HTTPException(status_code=400, detail="base64 inválido")
+        
+        size += len(data)
+        pending.append(data)
+        if len(pending) >= WRITEV_BATCH:
+            write_chunks(fd, pending)
+            pending.clear()
+    
+    if pending:
+        write_chunks(fd, pending)
+    return size
+
+
+@lru_cache(maxsize=32)
+def _forwarded_base_url(f_proto: Optional[str], f_host: str, f_port: Optional[str], req_scheme: str) -> str:
+    """Monta a BASE_URL a partir dos headers X-Forwarded-* (memoizado: o proxy repete a mesma tupla)."""
+    scheme = f_proto or req_scheme
+    host = f_host
+    
+    # Não adicionar porta se já estiver no host ou for porta padrão
+    if f_port and ":" not in host and f_port not in ("80", "443"):
+        # Só adicionar porta se não for a padrão do esquema
+        if not ((scheme == "http" and f_port == "80") or (scheme == "https" and f_port == "443")):
+            host = f"{host}:{f_port}"
+    
+    return f"{scheme}://{host}"
 
 
 def get_base_url(request: Request) -> str:
@@ -101,25 +232,18 @@ def get_base_url(request: Request) -> str:
     Determina a BASE_URL dinamicamente quando não definida em ambiente,
     respeitando proxies reversos (X-Forwarded-*) normalmente usados por Coolify/Traefik
     """
-    if BASE_URL_ENV:
-        return BASE_URL_ENV.rstrip("/")
+    if _BASE_URL_CACHED:
+        return _BASE_URL_CACHED
     
     # Verificar headers de proxy reverso (Coolify/Traefik)
-    f_proto = request.headers.get("x-forwarded-proto")
     f_host = request.headers.get("x-forwarded-host")
-    f_port = request.headers.get("x-forwarded-port")
-    
     if f_host:
-        scheme = f_proto or request.url.scheme
-        host = f_host
-        
-        # Não adicionar porta se já estiver no host ou for porta padrão
-        if f_port and ":" not in host and f_port not in ("80", "443"):
-            # Só adicionar porta se não for a padrão do esquema
-            if not ((scheme == "http" and f_port == "80") or (scheme == "https" and f_port == "443")):
-                host = f"{host}:{f_port}"
-        
-        return f"{scheme}://{host}"
+        return _forwarded_base_url(
+            request.headers.get("x-forwarded-proto"),
+            f_host,
+            request.headers.get("x-forwarded-port"),
+            request.scope["scheme"],
+        )
     
     # fallback direto
     base_url = str(request.base_url).rstrip("/")
@@ -127,51 +251,191 @@ def get_base_url(request: Request) -> str:
     return base_url
 
 
-def next_sequential_name(dir_path: str, base_prefix: str, ext: str, start: int = 1) -> str:
-    """
-    Adiciona parâmetro opcional 'start' para iniciar a busca a partir de um índice específico
+def open_exclusive(path: str) -> int:
+    """Cria o arquivo atomicamente (falha com FileExistsError se já existir)."""
+    return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+
+
+def scan_sequences(dir_path: str, base_prefix: str, ext: str) -> set:
+    """Lê o diretório uma única vez e retorna os sequenciais já usados para o prefixo."""
+    pattern = re.compile(rf"^{re.escape(base_prefix)}-(\d+)\.{re.escape(ext)}$")
+    used = set()
+    with os.scandir(dir_path) as it:
+        for entry in it:
+            m = pattern.match(entry.name)
+            if m:
+                used.add(int(m.group(1)))
+    return used
+
+
+def next_sequential_name(dir_path: str, base_prefix: str, ext: str, start: int = 1) -> tuple:
     """
-    if not os.path.exists(dir_path):
-        os.makedirs(dir_path, exist_ok=True)
+    Reserva o primeiro nome livre '{prefixo}-{n}.{ext}' com n >= start.
+    Retorna (nome, fd) com o arquivo já criado via O_EXCL e aberto para escrita.
+    O diretório deve existir (criado pelo chamador).
     
-    n = max(1, int(start))
+    Após o primeiro conflito, o conjunto de sequenciais em uso fica em cache: rajadas
+    no mesmo registro (com ou sem 'ponto') escolhem o candidato em memória e usam o
+    O_EXCL só como guarda contra corrida. Um conflito inesperado (ex.: arquivo criado
+    por outro worker) refaz o scandir; arquivos removidos por fora só voltam a ser
+    reaproveitados após um novo scandir.
+    """
+    key = (dir_path, base_prefix, ext)
     max_attempts = 10000  # Evitar loop infinito
-    attempts = 0
     
-    while attempts < max_attempts:
-        candidate = f"{base_prefix}-{n}.{ext}"
-        full = os.path.join(dir_path, candidate)
+    with _seq_locks[dir_path]:
+        n = max(0, int(start))
+        used = _seq_cache.get(key)
+        fresh = False  # 'used' veio de um scandir nesta chamada
         
-        if not os.path.exists(full):
+        for _ in range(max_attempts):
+            if used is not None:
+                while n in used:
+                    n += 1
+            candidate = f"{base_prefix}-{n}.{ext}"
             try:
-                # Usar 'x' mode para criar apenas se não existir
-                with open(full, "x") as f:
-                    pass  # Criar arquivo vazio
-                # Remover o arquivo temporário
-                os.unlink(full)
-                return candidate
+                fd = open_exclusive(os.path.join(dir_path, candidate))
             except FileExistsError:
-                pass  # Arquivo foi criado entre a verificação e a tentativa
-        
-        n += 1
-        attempts += 1
+                # Sem cache, ou cache desatualizado: um único scandir no lugar de um stat por candidato
+                if not fresh:
+                    used = scan_sequences(dir_path, base_prefix, ext)
+                    _seq_cache[key] = used
+                    fresh = True
+                used.add(n)  # Arquivo pode ter sido criado após o scandir
+                continue
+            except OSError:
+                _seq_cache.pop(key, None)
+                raise
+            if used is not None:
+                used.add(n)
+            return candidate, fd
     
     raise HTTPException(status_code=500, detail="Não foi possível gerar nome único")
 
 
+def _reserve(dir_path: str, base_prefix: str, ext: str, ponto: Optional[int]) -> tuple:
+    """
+    Reserva o nome final (arquivo criado via O_EXCL). Retorna (nome, fd).
+    Com 'ponto', tenta '{prefixo}-{ponto}' e, em conflito, o próximo livre acima dele.
+    """
+    return next_sequential_name(dir_path, base_prefix, ext, start=1 if ponto is None else ponto)
+
+
+def _discard(full_path: str) -> None:
+    """Remove um arquivo reservado/parcial sem mascarar o erro original."""
+    try:
+        os.unlink(full_path)
+    except FileNotFoundError:
+        pass  # Já descartado (ex.: item com falha num lote)
+    except OSError as e:
+        logger.error(f"Erro ao remover arquivo {full_path}: {e}")
+
+
+def _write_payload(fd: int, full_path: str, data_url: str, start: int) -> int:
+    """Grava o payload decodificado no arquivo reservado e fecha o fd. Retorna o tamanho."""
+    try:
+        try:
+            if hasattr(os, "posix_fallocate"):
+                # Pré-alocar o tamanho final evita extensões incrementais/fragmentação
+                try:
+                    os.posix_fallocate(fd, 0, decoded_size(data_url, start))
+                except OSError:
+                    pass  # FS sem suporte: seguir com escrita normal
+            return decode_to_file(fd, data_url, start)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logger.error(f"Erro ao escrever arquivo {full_path}: {e}")
+        # Arquivo reservado e pré-alocado: não deixar um arquivo com zeros publicado
+        _discard(full_path)
+        raise HTTPException(status_code=500, detail="Erro ao salvar arquivo")
+    except BaseException:
+        # Payload inválido (HTTPException) ou erro inesperado: descartar arquivo parcial
+        _discard(full_path)
+        raise
+
+
+def _persist(dir_path: str, base_prefix: str, ext: str, data_url: str, start: int, ponto: Optional[int]) -> tuple:
+    """
+    Parte síncrona do upload (executada em thread): cria o diretório, reserva o nome
+    final e grava o payload decodificado. Retorna (nome, caminho, tamanho).
+    """
+    os.makedirs(dir_path, exist_ok=True)
+    final_name, fd = _reserve(dir_path, base_prefix, ext, ponto)
+    full_path = os.path.join(dir_path, final_name)
+    size = _write_payload(fd, full_path, data_url, start)
+    return final_name, full_path, size
+
+
+def _reserve_batch(targets: list) -> list:
+    """
+    Reserva de uma vez os nomes de um lote. 'targets' é uma lista de
+    (dir_path, base_prefix, ext, ponto); retorna os nomes na mesma ordem, com os
+    arquivos já criados (vazios) via O_EXCL.
+    Itens do mesmo diretório são reservados num único trecho sob o lock dele: um
+    scandir por (prefixo, extensão) repetido no grupo alimenta o cache de
+    sequenciais, e cada item custa só o O_EXCL.
+    """
+    by_dir = defaultdict(list)
+    for i, target in enumerate(targets):
+        by_dir[target[0]].append(i)
+    
+    reserved = [None] * len(targets)
+    try:
+        for dir_path, indexes in by_dir.items():
+            os.makedirs(dir_path, exist_ok=True)
+            with _seq_locks[dir_path]:
+                keys = defaultdict(int)
+                for i in indexes:
+                    keys[(dir_path, targets[i][1], targets[i][2])] += 1
+                for key, count in keys.items():
+                    # Prefixos únicos (ex.: "misc") não justificam ler o diretório
+                    if count > 1 and key not in _seq_cache:
+                        _seq_cache[key] = scan_sequences(*key)
+                for i in indexes:
+                    _, base_prefix, ext, ponto = targets[i]
+                    name, fd = _reserve(dir_path, base_prefix, ext, ponto)
+                    reserved[i] = name
+                    os.close(fd)  # Reaberto na gravação; nenhum fd fica pendente entre awaits
+    except BaseException:
+        # Desfazer reservas parciais
+        for i, name in enumerate(reserved):
+            if name is not None:
+                _discard(os.path.join(targets[i][0], name))
+        raise
+    return reserved
+
+
+def _write_reserved(full_path: str, data_url: str, start: int) -> int:
+    """Reabre um arquivo reservado por _reserve_batch e grava o payload."""
+    try:
+        fd = os.open(full_path, os.O_WRONLY)
+    except OSError as e:
+        logger.error(f"Erro ao abrir arquivo {full_path}: {e}")
+        _discard(full_path)
+        raise HTTPException(status_code=500, detail="Erro ao salvar arquivo")
+    return _write_payload(fd, full_path, data_url, start)
+
+
 @app.get("/health")
-def health() -> dict:
+async def health() -> dict:
     """Endpoint simples de verificação de vida para Traefik/monitoração."""
+    # Checagens de disco reaproveitadas por HEALTH_CACHE_TTL segundos
+    now = time.monotonic()
+    if now - _health_cache["t"] > HEALTH_CACHE_TTL:
+        _health_cache["exists"] = os.path.exists(IMAGES_ROOT)
+        _health_cache["writable"] = os.access(IMAGES_ROOT, os.W_OK)
+        _health_cache["t"] = now
     return {
         "status": "ok",
         "service": "upload-service",
-        "images_root_exists": os.path.exists(IMAGES_ROOT),
-        "images_root_writable": os.access(IMAGES_ROOT, os.W_OK)
+        "images_root_exists": _health_cache["exists"],
+        "images_root_writable": _health_cache["writable"]
     }
 
 
 @app.get("/")
-def root_info(request: Request) -> dict:
+async def root_info(request: Request) -> dict:
     """
     Informações úteis para diagnosticar roteamento em produção.
     Observação: a porta efetiva é definida no comando de inicialização do Uvicorn
@@ -184,117 +448,173 @@ def root_info(request: Request) -> dict:
         "base_url": get_base_url(request),
         "cors_origins": CORS_ORIGINS,
         "max_size_mb": MAX_SIZE_MB,
-        "allowed_mimes": list(ALLOWED_MIMES.keys()),
+        "allowed_mimes": _ALLOWED_MIMES_LIST,
         "images_root": IMAGES_ROOT,
         "environment": os.getenv("ENVIRONMENT", "development")
     }
 
 
+def _prepare_upload(payload: UploadIn) -> tuple:
+    """
+    Valida o payload e resolve destino. Retorna
+    (mime, início do base64, extensão, registro, ponto, dir_path, base_prefix).
+    """
+    # Validações de entrada
+    if not payload.filename or not payload.data_url:
+        raise HTTPException(status_code=400, detail="filename e data_url são obrigatórios")
+    
+    # Parse da imagem
+    mime, start = parse_data_url(payload.data_url)
+    ext_by_mime = ALLOWED_MIMES[mime]
+    
+    # Sanitizar filename
+    filename = os.path.basename(payload.filename or f"upload.{ext_by_mime}")
+    filename = filename.encode("ascii", "ignore").translate(None, _FILENAME_DELETE)  # Remover caracteres perigosos
+
+    registro = payload.registro
+    ponto = payload.ponto
+
+    # Extrair informações do nome do arquivo se seguir o padrão
+    mfn = FILENAME_RE.match(filename)
+    if mfn:
+        if registro is None:
+            registro = int(mfn.group("registro"))
+        if ponto is None:
+            ponto = int(mfn.group("ponto"))
+
+    # Determinar diretório e nome base
+    if registro is None:
+        dir_path = os.path.join(IMAGES_ROOT, "misc")
+        base_prefix = uuid.uuid4().hex[:8]
+    else:
+        if not isinstance(registro, int) or registro < 0:
+            raise HTTPException(status_code=400, detail="registro inválido")
+        dir_path = os.path.join(IMAGES_ROOT, str(registro))
+        base_prefix = str(registro)
+
+    # Validar ponto
+    if ponto is not None and (not isinstance(ponto, int) or ponto < 0):
+        raise HTTPException(status_code=400, detail="ponto inválido")
+
+    return mime, start, ext_by_mime, registro, ponto, dir_path, base_prefix
+
+
+def _upload_result(request: Request, mime: str, size: int, registro: Optional[int],
+                   ponto: Optional[int], final_name: str, full_path: str) -> dict:
+    """Monta a resposta de um upload salvo."""
+    # Construir URL de resposta
+    if registro is None:
+        rel_url = f"/imagens/misc/{final_name}"
+    else:
+        rel_url = f"/imagens/{registro}/{final_name}"
+
+    base = get_base_url(request)
+    link = f"{base}{rel_url}"
+
+    logger.info(f"Arquivo salvo: {full_path}, link: {link}")
+
+    return {
+        "link": link,
+        "mime": mime,
+        "size": size,
+        "registro": registro,
+        "ponto": ponto,
+        "path": rel_url,
+        "filename": final_name
+    }
+
+
 @app.post("/upload")
 async def upload(payload: UploadIn, request: Request):
     """Upload de imagem com metadados opcionais."""
     try:
-        # Validações de entrada
-        if not payload.filename or not payload.data_url:
-            raise HTTPException(status_code=400, detail="filename e data_url são obrigatórios")
-        
-        # Parse da imagem
-        mime, binary = parse_data_url(payload.data_url)
-        ext_by_mime = ALLOWED_MIMES[mime]
-        
-        # Sanitizar filename
-        filename = os.path.basename(payload.filename or f"upload.{ext_by_mime}")
-        filename = re.sub(r'[^\w\-_\.]', '', filename)  # Remover caracteres perigosos
-        
-        if not filename:
-            filename = f"upload.{ext_by_mime}"
+        mime, start, ext_by_mime, registro, ponto, dir_path, base_prefix = _prepare_upload(payload)
 
-        registro = payload.registro
-        ponto = payload.ponto
+        # I/O de disco (diretório, nome, escrita) fora do event loop
+        final_name, full_path, size = await anyio.to_thread.run_sync(
+            _persist, dir_path, base_prefix, ext_by_mime, payload.data_url, start, ponto
+        )
 
-        # Extrair informações do nome do arquivo se seguir o padrão
-        mfn = FILENAME_RE.match(filename.lower())
-        if mfn:
-            if registro is None:
-                registro = int(mfn.group("registro"))
-            if ponto is None:
-                ponto = int(mfn.group("ponto"))
+        return _upload_result(request, mime, size, registro, ponto, final_name, full_path)
 
-        # Determinar diretório e nome base
-        if registro is None:
-            dir_path = os.path.join(IMAGES_ROOT, "misc")
-            base_prefix = uuid.uuid4().hex[:8]
-        else:
-            if not isinstance(registro, int) or registro < 0:
-                raise HTTPException(status_code=400, detail="registro inválido")
-            dir_path = os.path.join(IMAGES_ROOT, str(registro))
-            base_prefix = str(registro)
-
-        os.makedirs(dir_path, exist_ok=True)
-
-        # Validar ponto
-        if ponto is not None and (not isinstance(ponto, int) or ponto < 0):
-            raise HTTPException(status_code=400, detail="ponto inválido")
-
-        # Determinar nome final
-        if ponto is not None:
-            tentative_name = f"{base_prefix}-{ponto}.{ext_by_mime}"
-            full_path = os.path.join(dir_path, tentative_name)
-            if os.path.exists(full_path):
-                final_name = next_sequential_name(dir_path, base_prefix, ext_by_mime, start=ponto + 1)
-            else:
-                final_name = tentative_name
-        else:
-            final_name = next_sequential_name(dir_path, base_prefix, ext_by_mime)
-
-        full_path = os.path.join(dir_path, final_name)
-
-        # Escrever arquivo
-        try:
-            with open(full_path, "wb") as f:
-                f.write(binary)
-        except OSError as e:
-            logger.error(f"Erro ao escrever arquivo {full_path}: {e}")
-            raise HTTPException(status_code=500, detail="Erro ao salvar arquivo")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro inesperado no upload: {e}")
+        raise HTTPException(status_code=500, detail="Erro interno do servidor")
 
-        # Construir URL de resposta
-        if registro is None:
-            rel_url = f"/imagens/misc/{final_name}"
-        else:
-            rel_url = f"/imagens/{registro}/{final_name}"
 
-        base = get_base_url(request)
-        link = f"{base}{rel_url}"
+@app.post("/upload/batch")
+async def upload_batch(payloads: List[UploadIn], request: Request):
+    """
+    Upload de várias imagens de uma vez (ex.: rajada de fotos do mesmo registro).
+    Os nomes são reservados juntos e as gravações rodam em paralelo; se algum item
+    falhar, nenhum arquivo do lote é mantido.
+    """
+    try:
+        if not payloads:
+            raise HTTPException(status_code=400, detail="lote vazio")
+        if len(payloads) > MAX_BATCH_ITEMS:
+            raise HTTPException(status_code=400, detail=f"Lote > {MAX_BATCH_ITEMS} itens")
+
+        items = [_prepare_upload(p) for p in payloads]
 
-        logger.info(f"Arquivo salvo: {full_path}, link: {link}")
+        # Reserva de todos os nomes numa única ida à thread
+        targets = [(dir_path, base_prefix, ext, ponto) for _, _, ext, _, ponto, dir_path, base_prefix in items]
+        reserved = await anyio.to_thread.run_sync(_reserve_batch, targets)
 
-        return {
-            "link": link,
-            "mime": mime,
-            "size": len(binary),
-            "registro": registro,
-            "ponto": ponto,
-            "path": rel_url,
-            "filename": final_name
-        }
+        full_paths = [os.path.join(t[0], name) for t, name in zip(targets, reserved)]
+        try:
+            sizes = await asyncio.gather(
+                *(
+                    anyio.to_thread.run_sync(_write_reserved, full_path, p.data_url, item[1])
+                    for p, item, full_path in zip(payloads, items, full_paths)
+                ),
+                return_exceptions=True,
+            )
+
+            errors = [r for r in sizes if isinstance(r, BaseException)]
+            if errors:
+                raise errors[0]
+        except BaseException:
+            # Tudo ou nada (inclusive em cancelamento): remover todos os arquivos reservados
+            for full_path in full_paths:
+                _discard(full_path)
+            raise
+
+        return [
+            _upload_result(request, item[0], size, item[3], item[4], name, full_path)
+            for item, size, name, full_path in zip(items, sizes, reserved, full_paths)
+        ]
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Erro inesperado no upload: {e}")
+        logger.error(f"Erro inesperado no upload em lote: {e}")
         raise HTTPException(status_code=500, detail="Erro interno do servidor")
 
 
 # Middleware de log para debug
-@app.middleware("http")
 async def log_requests(request: Request, call_next):
     """Middleware para log de requisições (apenas em desenvolvimento)."""
-    if os.getenv("ENVIRONMENT") == "development":
-        logger.info(f"{request.method} {request.url}")
+    logger.info(f"{request.method} {request.url}")
     response = await call_next(request)
     return response
 
 
+# Registrar apenas em desenvolvimento: em produção não adiciona custo por requisição
+if _LOG_REQUESTS:
+    app.middleware("http")(log_requests)
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8002)
\ No newline at end of file
+    # uvloop/httptools (uvicorn[standard]); workers via WEB_CONCURRENCY (padrão: nº de CPUs)
+    uvicorn.run(
+        "app:app",
+        host="127.0.0.1",
+        port=8002,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    )
\ No newline at end of file
@@ -5,6 +5,8 @@ set -e
 export ENVIRONMENT=${ENVIRONMENT:-production}
 export PYTHONUNBUFFERED=1
 export PYTHONDONTWRITEBYTECODE=1
+# Nginx serve /imagens direto do disco; FastAPI não monta StaticFiles
+export SERVE_STATIC=${SERVE_STATIC:-0}
 
 # Função de log
 log() {
@@ -165,13 +167,11 @@ http {
             client_max_body_size 50M;
         }
 
-        # Servir imagens estáticas
-        location /imagens/ {
-            proxy_pass http://127.0.0.1:8002/imagens/;
-            proxy_set_header Host $host;
-            proxy_set_header X-Forwarded-Proto $proxy_x_forwarded_proto;
-            proxy_set_header X-Forwarded-Host $proxy_x_forwarded_host;
-            proxy_set_header X-Forwarded-Port $proxy_x_forwarded_port;
+        # Servir imagens estáticas direto do disco (sendfile, sem passar pelo Python)
+        location ^~ /imagens/ {
+            alias /app/imagens/;
+            sendfile on;
+            tcp_nopush on;
             
             # Cache headers para imagens
             expires 1d;
@@ -220,7 +220,7 @@ log "Starting FastAPI application..."
 if [ "$ENVIRONMENT" = "development" ]; then
     uvicorn app:app --host 127.0.0.1 --port 8002 --reload --log-level debug --root-path /api &
 else
-    uvicorn app:app --host 127.0.0.1 --port 8002 --workers 2 --log-level info --root-path /api &
+    uvicorn app:app --host 127.0.0.1 --port 8002 --workers ${WEB_CONCURRENCY:-2} --loop uvloop --http httptools --log-level info --root-path /api &
 fi
 
 UVICORN_PID=$!